@@ -17,6 +17,13 @@
 # python channel-splitter.py 221 *.flac 
 # - creates two stereo files followed by a series of mono files.
 #
+# python channel-splitter.py --jobs 4 2 *.wav 
+# - splits up to four files at a time (defaults to the number of CPUs).
+#
+# python channel-splitter.py --backend native 2 *.flac 
+# - splits wav, flac and aiff in-process with the optional soundfile package
+#   (wavpack still goes through SoX).
+#
 # Copyright (C) 2025 chmaha
 #
 # This program is free software: you can redistribute it and/or modify
@@ -32,33 +39,73 @@
 # You should have received a copy of the GNU General Public License
 # along with this program. If not, see <https://www.gnu.org/licenses/>.
 
+import atexit
+import contextlib
+import functools
+import multiprocessing
 import os
+import shutil
+import signal
 import subprocess
 import sys
+import tempfile
+import unicodedata
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+
+# soundfile (libsndfile + NumPy) is optional and only used by the native backend
+try:
+    import numpy
+    import soundfile
+except (ImportError, OSError):
+    numpy = soundfile = None
+
+# Formats that are expensive to decode repeatedly
+COMPRESSED_EXTENSIONS = ('.flac', '.wv')
+
+# Formats the native backend handles; anything else falls back to SoX
+NATIVE_EXTENSIONS = ('.wav', '.flac', '.aif', '.aiff')
+
+BACKENDS = ('sox', 'native')
+
+# Largest process pool Windows supports (WaitForMultipleObjects limit)
+WINDOWS_MAX_WORKERS = 61
+
+# Frames read per block by the native backend
+NATIVE_BLOCK_FRAMES = 65536
+
+# SoX remix arguments indexed by channel number (index 0 is unused)
+CHANNEL_ARGS = [None] + [str(i) for i in range(1, 1025)]
+
+# Shared by all worker processes to cap how many SoX processes run at once
+sox_slots = None
+
+# The --jobs limit (the number of slots in sox_slots); worker threads stay within it
+sox_jobs = os.cpu_count() or 1
 
+# Worker processes splitting files side by side, used to share out the CPUs
+pool_workers = 1
 
+
+@functools.lru_cache(maxsize=None)
 def check_sox_installed():
     """Check if SoX is installed."""
-    # Check if SoX is in PATH
-    try:
-        subprocess.run(["sox", '--version'],
-                       capture_output=True, text=True, check=True)
-        return "sox"
-    except (subprocess.CalledProcessError, FileNotFoundError):
-        pass
+    # Check if SoX is in PATH (a PATH lookup, no need to launch it)
+    sox_path = shutil.which("sox")
+    if sox_path:
+        return sox_path
 
-    # On Windows, check common installation paths
+    # On Windows, check common installation paths (one listing per root)
     if os.name == 'nt':
-        common_paths = [
-            r"C:\\Program Files (x86)\\sox-*",
-            r"C:\\Program Files\\sox-*"
-        ]
-
-        for base_path in common_paths:
-            path_pattern = os.path.join(base_path, "sox.exe")
-            for sox_path in glob.glob(path_pattern):
-                if os.path.exists(sox_path):
-                    return sox_path
+        for root in (r"C:\Program Files (x86)", r"C:\Program Files"):
+            try:
+                entries = list(os.scandir(root))
+            except OSError:
+                continue
+            for entry in entries:
+                if entry.name.lower().startswith('sox-') and entry.is_dir():
+                    sox_path = os.path.join(entry.path, "sox.exe")
+                    if os.path.isfile(sox_path):
+                        return sox_path
 
     # If SoX isn't found, inform the user
     if os.name == "posix":
@@ -74,14 +121,25 @@ def check_sox_installed():
     sys.exit(1)
 
 
+@functools.lru_cache(maxsize=None)
+def pattern_sizes(grouping_pattern):
+    """Convert the grouping pattern's ASCII digits to a tuple of group sizes."""
+    return tuple(ord(digit) - 48 for digit in grouping_pattern)
+
+
 def validate_grouping_pattern(grouping_pattern, total_channels):
     """Validate the grouping pattern against the total channel count."""
-    if len(grouping_pattern) == 1 and int(grouping_pattern) == total_channels:
+    sizes = pattern_sizes(grouping_pattern)
+    if 0 in sizes:
+        print(f"Error: The grouping pattern '{grouping_pattern}' contains a 0. Each group needs at least one channel.")
+        return False
+
+    if len(sizes) == 1 and sizes[0] == total_channels:
         print(f"Error: The grouping pattern '{grouping_pattern}' is the same as the total channel count ({total_channels}). No splitting needed.")
         return False
 
     # Check if the sum of the digits in the grouping pattern exceeds the total channels
-    total_pattern = sum(int(digit) for digit in grouping_pattern)
+    total_pattern = sum(sizes)
     if total_pattern > total_channels:
         print(f"Error: The sum of the digits in the grouping pattern ({total_pattern}) exceeds the number of channels ({total_channels}).")
         return False
@@ -89,24 +147,35 @@ def validate_grouping_pattern(grouping_pattern, total_channels):
     return True
 
 
-def check_files_exist(input_file, grouping_pattern):
-    """Check if any output files already exist."""
-    channel_start = 1
-    remaining_channels = int(subprocess.run(['sox', '--i', '-c', input_file], capture_output=True, text=True).stdout.strip())
-    pattern_index = 0
-    existing_files = []
-
-    while remaining_channels > 0:
-        # Determine group size based on the pattern
-        if pattern_index < len(grouping_pattern):
-            group_size = int(grouping_pattern[pattern_index])
-            pattern_index += 1
-        else:
-            group_size = int(grouping_pattern[-1])
+def plan_groups(input_file, grouping_pattern, total_channels):
+    """Work out every output group for the input file.
 
+    Returns a list of (channel_start, group_size, output_file) tuples.
+    """
+    base_name, ext = os.path.splitext(input_file)
+    sizes = pattern_sizes(grouping_pattern)
+    remaining_channels = total_channels
+    group_sizes = []
+
+    # Follow the pattern digits first
+    for group_size in sizes:
+        if remaining_channels <= 0:
+            break
+        # Adjust group size if remaining channels are less
         if group_size > remaining_channels:
             group_size = 1
+        group_sizes.append(group_size)
+        remaining_channels -= group_size
 
+    # Then repeat the last digit as often as it fits, leaving mono remainders
+    tail_size = sizes[-1]
+    tail_groups, remainder = divmod(max(remaining_channels, 0), tail_size)
+    group_sizes.extend([tail_size] * tail_groups)
+    group_sizes.extend([1] * remainder)
+
+    channel_start = 1
+    plan = []
+    for group_size in group_sizes:
         # Determine the range of channels for the current output file
         if group_size == 1:
             group_name = f"{channel_start}"
@@ -114,105 +183,375 @@ def check_files_exist(input_file, grouping_pattern):
             group_name = f"{channel_start}-{channel_start + group_size - 1}"
 
         # Create the output file name
-        base_name, ext = os.path.splitext(input_file)
         output_file = f"{base_name}[{group_name}]{ext}"
+        plan.append((channel_start, group_size, output_file))
+        channel_start += group_size
 
-        if os.path.exists(output_file):
-            existing_files.append(output_file)
+    return plan
 
-        channel_start += group_size
-        remaining_channels -= group_size
 
-    return existing_files
+def fold_name(name):
+    """Normalise a file name the way the platform's default filesystem compares names.
+
+    Windows (NTFS) and macOS (APFS/HFS+) are case-insensitive by default, and
+    macOS also treats composed and decomposed Unicode forms as the same name.
+    """
+    if sys.platform == 'darwin':
+        return unicodedata.normalize('NFC', name).casefold()
+    if os.name == 'nt':
+        return name.casefold()
+    return name
+
+
+def check_files_exist(input_file, plan):
+    """Check if any of the planned output files already exist."""
+    # Outputs sit next to the input, so one directory listing covers them all
+    parent = os.path.dirname(input_file) or '.'
+    try:
+        with os.scandir(parent) as entries:
+            existing = {fold_name(entry.name) for entry in entries}
+    except OSError:
+        # The directory can't be listed, so check each output directly
+        return [output_file for _, _, output_file in plan if os.path.exists(output_file)]
+
+    return [output_file for _, _, output_file in plan
+            if fold_name(os.path.basename(output_file)) in existing]
+
 
+def prepare_file(sox_command, input_file, grouping_pattern):
+    """Validate an input file and confirm overwrites before it is split.
 
-def split_channels(sox_command, input_file, grouping_pattern):
-    """Split the channels of the input audio file according to a grouping pattern."""
+    Runs in the parent process so that worker processes never prompt.
+    Returns the output group plan, or None if the file should be skipped.
+    """
     # Get total number of channels using SoX
     result = subprocess.run(
-        [sox_command, '--i', '-c', input_file], capture_output=True, text=True)
+        [sox_command, '--i', '-c', input_file],
+        stdout=subprocess.PIPE, stderr=devnull_fd())
     try:
-        total_channels = int(result.stdout.strip())
+        total_channels = int(result.stdout)
     except ValueError:
         print(f"Error: Unable to determine the number of channels in {input_file}.")
-        return
+        return None
 
     print(f"Total channels in '{input_file}': {total_channels}")
 
     # Validate the grouping pattern
     if not validate_grouping_pattern(grouping_pattern, total_channels):
-        return
+        return None
 
     # Check if any output files already exist
-    existing_files = check_files_exist(input_file, grouping_pattern)
+    plan = plan_groups(input_file, grouping_pattern, total_channels)
+    existing_files = check_files_exist(input_file, plan)
     if existing_files:
         print(f"Warning: The following output files already exist:")
         for file in existing_files:
             print(f"  {file}")
         user_input = input("Do you want to continue and overwrite these files? (y/n): ")
         if user_input.lower() != 'y':
-            print("Exiting without making changes.")
-            return
+            print(f"Skipping '{input_file}' without making changes.")
+            return None
 
-    channel_start = 1
-    remaining_channels = total_channels
-    pattern_index = 0
+    return plan
 
-    while remaining_channels > 0:
-        # Determine group size based on the pattern
-        if pattern_index < len(grouping_pattern):
-            group_size = int(grouping_pattern[pattern_index])
-            pattern_index += 1
-        else:
-            # Use the last digit of the pattern for remaining groups
-            group_size = int(grouping_pattern[-1])
 
-        # Adjust group size if remaining channels are less
-        if group_size > remaining_channels:
-            group_size = 1
+def init_worker(slots, jobs, workers):
+    """Give a worker process the shared SoX slot semaphore, its size and the pool size."""
+    global sox_slots, sox_jobs, pool_workers
+    sox_slots = slots
+    sox_jobs = jobs
+    pool_workers = workers
 
-        # Determine the range of channels for the current output file
-        if group_size == 1:
-            group_name = f"{channel_start}"
-        else:
-            group_name = f"{channel_start}-{channel_start + group_size - 1}"
 
-        # Create the output file name
-        base_name, ext = os.path.splitext(input_file)
-        output_file = f"{base_name}[{group_name}]{ext}"
+@functools.lru_cache(maxsize=None)
+def devnull_fd():
+    """Open os.devnull once per process and share the descriptor across SoX runs."""
+    fd = os.open(os.devnull, os.O_WRONLY)
+    atexit.register(os.close, fd)
+    return fd
+
+
+def spawn_sox(command):
+    """Launch SoX with os.posix_spawnp and wait for it.
+
+    Unlike fork, posix_spawn does not copy the parent's page tables, which
+    matters once the parent holds large buffers. Returns (returncode, stderr).
+    """
+    read_fd, write_fd = os.pipe()
+    try:
+        # Reset the signals Python ignores, as subprocess does by default
+        pid = os.posix_spawnp(command[0], command, os.environ, file_actions=[
+            (os.POSIX_SPAWN_DUP2, devnull_fd(), 1),
+            (os.POSIX_SPAWN_DUP2, write_fd, 2),
+        ], setsigdef=(signal.SIGPIPE, signal.SIGXFSZ))
+    except OSError:
+        os.close(read_fd)
+        raise
+    finally:
+        os.close(write_fd)
+
+    with os.fdopen(read_fd, 'rb') as stderr_pipe:
+        stderr = stderr_pipe.read()
+    _, status = os.waitpid(pid, 0)
+    # Match subprocess: a negative return code is the signal that killed SoX
+    if os.WIFSIGNALED(status):
+        return -os.WTERMSIG(status), stderr
+    return os.WEXITSTATUS(status), stderr
+
+
+def run_sox(command):
+    """Run SoX quietly, keeping its error output only for reporting failures."""
+    with sox_slots if sox_slots is not None else contextlib.nullcontext():
+        if not hasattr(os, 'posix_spawnp'):
+            subprocess.run(command, stdout=devnull_fd(), stderr=subprocess.PIPE, check=True)
+            return
+
+        returncode, stderr = spawn_sox(command)
+        if returncode != 0:
+            raise subprocess.CalledProcessError(returncode, command, stderr=stderr)
+
 
-        # Run SoX to split the channels
-        remix_args = [str(i) for i in range(channel_start, channel_start + group_size)]
-        subprocess.run(['sox', input_file, output_file, 'remix'] + remix_args)
+def split_channels_native(input_file, plan):
+    """Split the channels in-process with soundfile, streaming the input once.
+
+    Blocks of frames are read and scattered to every output, so memory use
+    stays constant however long the input is. Returns False without writing
+    anything if libsndfile can't read the input.
+    """
+    # Codecs libsndfile can't read (e.g. compressed WAV) go to SoX instead
+    try:
+        source = soundfile.SoundFile(input_file)
+    except RuntimeError:
+        return False
 
+    created = []
+    try:
+        with contextlib.ExitStack() as stack:
+            stack.enter_context(source)
+            # Read float formats as float so nothing is quantised on the way through
+            dtype = 'float64' if source.subtype in ('FLOAT', 'DOUBLE') else 'int32'
+
+            # Carry the input's tags over, as SoX does for its outputs
+            metadata = source.copy_metadata()
+
+            sinks = []
+            for channel_start, group_size, output_file in plan:
+                sink = stack.enter_context(soundfile.SoundFile(
+                    output_file, 'w', samplerate=source.samplerate, channels=group_size,
+                    subtype=source.subtype, format=source.format))
+                created.append(output_file)
+                for key, value in metadata.items():
+                    setattr(sink, key, value)
+                sinks.append(sink)
+
+            # Writes to the outputs overlap; libsndfile releases the GIL while
+            # encoding and writing, so this also spreads FLAC encoding over this
+            # worker's share of the --jobs limit
+            writers = max(1, sox_jobs // pool_workers)
+            writer = stack.enter_context(ThreadPoolExecutor(max_workers=min(len(sinks), writers)))
+
+            # The groups partition the channels, so one flat buffer the size of a
+            # block holds every output contiguously and is reused for each block
+            buffer = numpy.empty(NATIVE_BLOCK_FRAMES * source.channels, dtype=dtype)
+
+            for block in source.blocks(blocksize=NATIVE_BLOCK_FRAMES, dtype=dtype, always_2d=True):
+                frames = len(block)
+                outputs = []
+                for channel_start, group_size, _ in plan:
+                    first = channel_start - 1
+                    output = buffer[frames * first:frames * (first + group_size)].reshape(frames, group_size)
+                    numpy.copyto(output, block[:, first:first + group_size])
+                    outputs.append(output)
+
+                # Every write must finish before the buffer is refilled
+                list(writer.map(soundfile.SoundFile.write, sinks, outputs))
+    except BaseException:
+        # Don't leave half-written outputs behind
+        for output_file in created:
+            with contextlib.suppress(OSError):
+                os.remove(output_file)
+        raise
+
+    for _, _, output_file in plan:
         print(f"Saved {output_file}")
+    return True
 
-        # Update the channel start and remaining channels
-        channel_start += group_size
-        remaining_channels -= group_size
+
+def remix_channels(channel_start, group_size):
+    """Return the SoX remix arguments for a run of channels."""
+    channel_end = channel_start + group_size
+    if channel_end > len(CHANNEL_ARGS):
+        CHANNEL_ARGS.extend(str(i) for i in range(len(CHANNEL_ARGS), channel_end))
+    return CHANNEL_ARGS[channel_start:channel_end]
+
+
+def decoded_fits(sox_command, input_file, plan, temp_parent):
+    """Check there is room next to the input for its temporary decoded copy."""
+    sizes = []
+    for option in ('-s', '-b'):
+        result = subprocess.run([sox_command, '--i', option, input_file],
+                                stdout=subprocess.PIPE, stderr=devnull_fd())
+        try:
+            sizes.append(int(result.stdout))
+        except ValueError:
+            # Unknown length or precision; let the decode itself find out
+            return True
+
+    samples, bits = sizes
+    total_channels = sum(group_size for _, group_size, _ in plan)
+    needed = samples * total_channels * ((bits + 7) // 8)
+    try:
+        return shutil.disk_usage(temp_parent).free > needed
+    except OSError:
+        return True
+
+
+def split_channels(sox_command, input_file, plan, backend='sox'):
+    """Split the channels of the input audio file according to its group plan."""
+    ext = os.path.splitext(input_file)[1]
+    if backend == 'native' and ext.lower() in NATIVE_EXTENSIONS:
+        if split_channels_native(input_file, plan):
+            return
+
+    # SoX writes one output per run, so decode compressed input once into a
+    # temporary Wave64 file (no 4 GiB limit) that every group reads from
+    source_file = input_file
+    output_options = []
+    temp_dir = None
+    try:
+        temp_parent = os.path.dirname(input_file) or '.'
+        if (len(plan) > 1 and ext.lower() in COMPRESSED_EXTENSIONS
+                and decoded_fits(sox_command, input_file, plan, temp_parent)):
+            try:
+                temp_dir = tempfile.mkdtemp(dir=temp_parent)
+            except OSError as e:
+                print(f"Error: Unable to create a temporary file next to '{input_file}': {e}")
+                return
+            source_file = os.path.join(temp_dir, 'decoded.w64')
+            try:
+                run_sox([sox_command, '-q', input_file, source_file])
+            except subprocess.CalledProcessError:
+                # e.g. out of disk space; read the original for every group instead
+                shutil.rmtree(temp_dir, ignore_errors=True)
+                temp_dir = None
+                source_file = input_file
+
+        if temp_dir is not None:
+            # Wave64 carries no comments, so copy the original's tags onto
+            # each output the way SoX would when reading the input directly
+            comments = subprocess.run(
+                [sox_command, '--i', '-a', input_file],
+                stdout=subprocess.PIPE, stderr=devnull_fd()).stdout
+            if comments.strip():
+                comment_file = os.path.join(temp_dir, 'comments.txt')
+                with open(comment_file, 'wb') as f:
+                    f.write(comments)
+                output_options = ['--comment-file', comment_file]
+
+        # Run SoX for every group at once; after the first read the input
+        # is in the page cache, and sox_slots keeps the total bounded
+        with ThreadPoolExecutor(max_workers=min(len(plan), sox_jobs)) as executor:
+            futures = []
+            for channel_start, group_size, output_file in plan:
+                command = [sox_command, '-q', source_file] + output_options + [output_file, 'remix']
+                command += remix_channels(channel_start, group_size)
+                futures.append((output_file, executor.submit(run_sox, command)))
+
+            # Report in plan order rather than completion order
+            for output_file, future in futures:
+                try:
+                    future.result()
+                except subprocess.CalledProcessError as e:
+                    print(f"Error: SoX failed to write '{output_file}': {e.stderr.decode(errors='replace').strip()}")
+                else:
+                    print(f"Saved {output_file}")
+    except subprocess.CalledProcessError as e:
+        print(f"Error: SoX failed while splitting '{input_file}': {e.stderr.decode(errors='replace').strip()}")
+    finally:
+        if temp_dir is not None:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+def parse_options(args):
+    """Strip leading '--jobs N' and '--backend NAME' options from the argument list.
+
+    Returns (jobs, backend, remaining_args), or None if an option is invalid.
+    """
+    jobs = os.cpu_count() or 1
+    backend = 'sox'
+    while args and args[0] in ('-j', '--jobs', '--backend'):
+        if len(args) < 2:
+            print(f"Error: {args[0]} requires a value.")
+            return None
+        option, value, args = args[0], args[1], args[2:]
+        if option == '--backend':
+            if value not in BACKENDS:
+                print(f"Error: Unknown backend '{value}'. Choose from: {', '.join(BACKENDS)}.")
+                return None
+            backend = value
+        else:
+            if not value.isdigit() or int(value) < 1:
+                print("Error: --jobs requires a positive integer.")
+                return None
+            jobs = int(value)
+    return jobs, backend, args
 
 
 def main():
     sox_command = check_sox_installed()
 
-    if len(sys.argv) < 3:
-        print("Usage: python channel-splitter.py <grouping_pattern> <input_file>")
+    options = parse_options(sys.argv[1:])
+    if options is None:
+        return
+    jobs, backend, args = options
+
+    if len(args) < 2:
+        print("Usage: python channel-splitter.py [--jobs N] [--backend sox|native] <grouping_pattern> <input_file>")
         print("Example: python channel-splitter.py 321 test_20channel.wav")
         return
 
-    grouping_pattern = sys.argv[1]
-    if not grouping_pattern.isdigit():
+    if backend == 'native' and soundfile is None:
+        print("Error: The native backend requires the soundfile package (pip install soundfile).")
+        return
+
+    grouping_pattern = args[0]
+    if not (grouping_pattern.isascii() and grouping_pattern.isdigit()):
         print("Error: Grouping pattern must consist of digits only.")
         return
 
-    input_files = sys.argv[2:]
+    input_files = args[1:]
 
+    # Validate every file and ask about overwrites up front
+    pending = []
     for input_file in input_files:
         if not os.path.isfile(input_file):
             print(f"Error: File '{input_file}' not found.")
             continue
 
-        split_channels(sox_command, input_file, grouping_pattern)
+        plan = prepare_file(sox_command, input_file, grouping_pattern)
+        if plan is not None:
+            pending.append((input_file, plan))
+
+    if not pending:
+        return
+
+    # Each file is independent, so split them in parallel
+    slots = multiprocessing.Semaphore(jobs)
+    workers = min(jobs, len(pending))
+    if sys.platform == 'win32':
+        # ProcessPoolExecutor rejects more than 61 workers on Windows
+        workers = min(workers, WINDOWS_MAX_WORKERS)
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker,
+                             initargs=(slots, jobs, workers)) as executor:
+        futures = {
+            executor.submit(split_channels, sox_command, input_file, plan, backend): input_file
+            for input_file, plan in pending
+        }
+        for future in as_completed(futures):
+            try:
+                future.result()
+            except Exception as e:
+                print(f"Error: Failed to split '{futures[future]}': {e}")
 
 
 if __name__ == "__main__":